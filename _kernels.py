@@ -0,0 +1,85 @@
+"""Compiled numerical kernels for motion analysis."""
+import math
+from typing import Tuple
+
+import numpy as np
+from numba import njit
+
+
+# fastmath without "nnan": padded joints are NaN and must still be detected
+_FASTMATH = {"nsz", "arcp", "contract", "afn", "reassoc"}
+
+
+@njit(cache=True, nogil=True, fastmath=_FASTMATH)
+def compute_velocities(coords: np.ndarray, ts: np.ndarray) -> np.ndarray:
+    """
+    Calculate frame-to-frame velocities in a single fused pass.
+
+    Args:
+        coords: Packed keypoint coordinates [F, K, 3], NaN for missing joints
+        ts: Frame timestamps [F]
+
+    Returns:
+        Average keypoint speed between consecutive frames [F - 1]
+    """
+    n_frames, n_keypoints = coords.shape[0], coords.shape[1]
+    velocities = np.empty(max(n_frames - 1, 0), dtype=np.float64)
+
+    for i in range(n_frames - 1):
+        dt = ts[i + 1] - ts[i]
+        if dt <= 0:
+            dt = 0.033  # Default to ~30fps
+
+        # Average displacement over joints present in both frames
+        displacement = 0.0
+        count = 0
+        for j in range(n_keypoints):
+            dx = coords[i + 1, j, 0] - coords[i, j, 0]
+            dy = coords[i + 1, j, 1] - coords[i, j, 1]
+            dz = coords[i + 1, j, 2] - coords[i, j, 2]
+            dist = math.sqrt(dx * dx + dy * dy + dz * dz)
+            if not math.isnan(dist):
+                displacement += dist
+                count += 1
+
+        velocities[i] = displacement / max(count, 1) / dt
+
+    return velocities
+
+
+@njit(cache=True, nogil=True, fastmath=_FASTMATH)
+def velocity_stats(velocities: np.ndarray) -> Tuple[float, float]:
+    """
+    Calculate mean velocity and acceleration variance in a single pass.
+
+    Accelerations are the frame-to-frame velocity differences; their
+    variance is accumulated with Welford's online update, so no
+    acceleration array is materialized.
+
+    Args:
+        velocities: Frame-to-frame velocities [N]
+
+    Returns:
+        Tuple of (mean velocity, acceleration variance)
+    """
+    n = velocities.shape[0]
+    if n == 0:
+        return 0.0, 0.0
+
+    v_sum = float(velocities[0])
+    a_mean = 0.0
+    a_m2 = 0.0
+    for i in range(1, n):
+        v_sum += velocities[i]
+        a = float(velocities[i]) - float(velocities[i - 1])
+        delta = a - a_mean
+        a_mean += delta / i
+        a_m2 += delta * (a - a_mean)
+
+    return v_sum / n, a_m2 / max(n - 1, 1)
+
+
+def warm_up() -> None:
+    """Compile (or load from cache) all kernels for the dtypes used at runtime."""
+    velocities = compute_velocities(np.zeros((2, 1, 3), dtype=np.float64), np.zeros(2, dtype=np.float64))
+    velocity_stats(velocities)
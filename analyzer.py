@@ -1,65 +1,156 @@
 """Motion analysis and scoring algorithms."""
 import numpy as np
-from typing import List, Tuple
-from models import MotionData, Frame, KeyPoint, TimingMetrics, MovementMetrics, FeedbackItem
+from typing import List, Optional, Tuple, Union
+from _kernels import compute_velocities, velocity_stats
+from models import MotionData, Frame, TimingMetrics, MovementMetrics, FeedbackItem
+from payload import PackedMotion, check_keypoint_padding, pack_keypoints
+
+
+def _clip(value: float, low: float, high: float) -> float:
+    """Clip a scalar with builtins, avoiding NumPy's per-call dispatch overhead."""
+    return float(min(max(value, low), high))
+
+
+def _percentile(values: np.ndarray, q: float) -> float:
+    """
+    Linear-interpolated percentile from a partial O(n) partition, not a sort.
+    
+    Matches np.percentile exactly, including its interpolation from the upper
+    neighbour when the fractional position is at least 0.5.
+    """
+    pos = q / 100.0 * (len(values) - 1)
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    ordered = np.partition(values, (lo, hi))
+    below, above = ordered[lo], ordered[hi]
+    frac = pos - lo
+    if frac >= 0.5:
+        return above - (above - below) * (1.0 - frac)
+    return below + (above - below) * frac
+
+
+# Template for the off-beat timing feedback, which is built per request
+_TIMING_OFF_MESSAGE = (
+    "Your timing is off. Try to sync your movements with the beat. "
+    "You're hitting {:.1f}% of beats on time."
+)
+
+# Constant coaching feedback, built once without validation and shared across
+# responses. Treat these as immutable.
+_FEEDBACK_TIMING_GOOD = FeedbackItem.model_construct(
+    category="timing",
+    message="Excellent timing! You're perfectly synced with the music.",
+    severity="info",
+    timestamp=None
+)
+_FEEDBACK_JERKY = FeedbackItem.model_construct(
+    category="form",
+    message="Your movements are a bit jerky. Focus on flowing smoothly between positions.",
+    severity="warning",
+    timestamp=None
+)
+_FEEDBACK_ENERGY_LOW = FeedbackItem.model_construct(
+    category="energy",
+    message="Put more energy into your movements! Go bigger and stronger.",
+    severity="info",
+    timestamp=None
+)
+_FEEDBACK_ENERGY_HIGH = FeedbackItem.model_construct(
+    category="energy",
+    message="Great energy! Keep up that intensity.",
+    severity="info",
+    timestamp=None
+)
+_FEEDBACK_FORM = FeedbackItem.model_construct(
+    category="form",
+    message="Pay attention to your posture and alignment. Keep your core engaged.",
+    severity="warning",
+    timestamp=None
+)
+_FEEDBACK_ACCURACY = FeedbackItem.model_construct(
+    category="accuracy",
+    message="Your movements are inconsistent. Try to replicate the reference motion more precisely.",
+    severity="warning",
+    timestamp=None
+)
+_FEEDBACK_OVERALL = FeedbackItem.model_construct(
+    category="overall",
+    message="Outstanding performance! All metrics look great.",
+    severity="info",
+    timestamp=None
+)
 
 
 class MotionAnalyzer:
     """Analyzes motion data and generates predictions."""
     
+    # Weighted combination of metrics in the overall score
+    _WEIGHTS = {
+        'timing': 0.25,
+        'smoothness': 0.20,
+        'accuracy': 0.25,
+        'energy': 0.15,
+        'form': 0.15
+    }
+    
     def __init__(self, scoring_threshold: float = 0.7):
         self.scoring_threshold = scoring_threshold
     
-    def analyze(self, motion_data: MotionData) -> Tuple[TimingMetrics, MovementMetrics, List[FeedbackItem]]:
+    def analyze(
+        self,
+        motion_data: Union[MotionData, PackedMotion]
+    ) -> Tuple[TimingMetrics, MovementMetrics, List[FeedbackItem]]:
         """
         Analyze motion data and generate metrics and feedback.
         
         Args:
-            motion_data: Input motion data
+            motion_data: Input motion data, either as frame models or already
+                packed into arrays
             
         Returns:
             Tuple of (timing_metrics, movement_metrics, feedback)
         """
+        # Pack frames (unless already packed) and compute velocities once
+        if isinstance(motion_data, PackedMotion):
+            coords, ts, conf = motion_data.coords, motion_data.ts, motion_data.conf
+        else:
+            coords, ts, conf = self._pack_frames(motion_data.frames)
+        velocities = self._calculate_velocities(coords, ts)
+        
+        # Movement peaks are only used for beat sync, so skip them without a tempo
+        peaks = self._detect_movement_peaks(velocities, ts) if motion_data.audio_bpm else None
+        
         # Extract timing metrics
-        timing_metrics = self._analyze_timing(motion_data)
+        timing_metrics = self._analyze_timing(motion_data, peaks)
         
         # Analyze movement quality
-        movement_metrics = self._analyze_movement(motion_data)
+        movement_metrics = self._analyze_movement(velocities, coords, conf)
         
         # Generate coaching feedback
         feedback = self._generate_feedback(timing_metrics, movement_metrics, motion_data)
         
         return timing_metrics, movement_metrics, feedback
     
-    def _analyze_timing(self, motion_data: MotionData) -> TimingMetrics:
-        """Analyze timing and synchronization with music."""
-        frames = motion_data.frames
-        
+    def _analyze_timing(
+        self,
+        motion_data: Union[MotionData, PackedMotion],
+        peaks: Optional[np.ndarray]
+    ) -> TimingMetrics:
+        """Analyze timing and synchronization of movement peaks with music."""
         if motion_data.audio_bpm:
             # Calculate beat interval
             beat_interval = 60.0 / motion_data.audio_bpm
             
-            # Analyze movement peaks vs beats
-            velocities = self._calculate_velocities(frames)
-            peaks = self._detect_movement_peaks(velocities)
-            
-            # Calculate synchronization
-            on_beat_count = 0
-            total_peaks = len(peaks)
-            lag_sum = 0.0
-            
-            for peak_time in peaks:
-                # Find nearest beat
-                nearest_beat = round(peak_time / beat_interval) * beat_interval
-                lag = abs(peak_time - nearest_beat)
-                lag_sum += lag
-                
+            # Calculate synchronization against the nearest beat
+            if peaks.size:
+                half = beat_interval * 0.5
+                lags = np.abs((peaks + half) % beat_interval - half)
+                avg_lag_ms = float(lags.mean()) * 1000
                 # Consider "on beat" if within 100ms of beat
-                if lag < 0.1:
-                    on_beat_count += 1
-            
-            avg_lag_ms = (lag_sum / max(total_peaks, 1)) * 1000
-            on_beat_percentage = (on_beat_count / max(total_peaks, 1)) * 100
+                on_beat_percentage = float((lags < 0.1).mean()) * 100
+            else:
+                avg_lag_ms = 0.0
+                on_beat_percentage = 0.0
             sync_score = 1.0 - min(avg_lag_ms / 200, 1.0)  # Normalize to 0-1
         else:
             # No BPM provided, use default values
@@ -73,25 +164,21 @@ class MotionAnalyzer:
             on_beat_percentage=on_beat_percentage
         )
     
-    def _analyze_movement(self, motion_data: MotionData) -> MovementMetrics:
+    def _analyze_movement(
+        self,
+        velocities: np.ndarray,
+        coords: np.ndarray,
+        conf: np.ndarray
+    ) -> MovementMetrics:
         """Analyze movement quality metrics."""
-        frames = motion_data.frames
-        
-        # Calculate velocities and accelerations
-        velocities = self._calculate_velocities(frames)
-        accelerations = self._calculate_accelerations(velocities)
-        
-        # Smoothness: low variance in acceleration indicates smooth movement
-        smoothness_score = self._calculate_smoothness(accelerations)
-        
-        # Energy: average velocity magnitude
-        energy_score = self._calculate_energy(velocities)
+        # Smoothness (acceleration variance) and energy (average velocity)
+        smoothness_score, energy_score = self._movement_stats(velocities)
         
         # Accuracy: consistency in movement patterns
-        accuracy_score = self._calculate_accuracy(frames)
+        accuracy_score = self._calculate_accuracy(coords)
         
         # Form: posture and alignment quality
-        form_score = self._calculate_form(frames)
+        form_score = self._calculate_form(conf)
         
         return MovementMetrics(
             smoothness_score=smoothness_score,
@@ -104,210 +191,147 @@ class MotionAnalyzer:
         self, 
         timing_metrics: TimingMetrics, 
         movement_metrics: MovementMetrics,
-        motion_data: MotionData
+        motion_data: Union[MotionData, PackedMotion]
     ) -> List[FeedbackItem]:
         """Generate coaching feedback based on analysis."""
         feedback = []
         
         # Timing feedback
         if timing_metrics.sync_score < 0.7:
-            feedback.append(FeedbackItem(
+            feedback.append(FeedbackItem.model_construct(
                 category="timing",
-                message=f"Your timing is off. Try to sync your movements with the beat. "
-                       f"You're hitting {timing_metrics.on_beat_percentage:.1f}% of beats on time.",
+                message=_TIMING_OFF_MESSAGE.format(timing_metrics.on_beat_percentage),
                 severity="warning",
                 timestamp=None
             ))
         elif timing_metrics.sync_score >= 0.9:
-            feedback.append(FeedbackItem(
-                category="timing",
-                message="Excellent timing! You're perfectly synced with the music.",
-                severity="info",
-                timestamp=None
-            ))
+            feedback.append(_FEEDBACK_TIMING_GOOD)
         
         # Smoothness feedback
         if movement_metrics.smoothness_score < 0.6:
-            feedback.append(FeedbackItem(
-                category="form",
-                message="Your movements are a bit jerky. Focus on flowing smoothly between positions.",
-                severity="warning",
-                timestamp=None
-            ))
+            feedback.append(_FEEDBACK_JERKY)
         
         # Energy feedback
         if movement_metrics.energy_score < 0.5:
-            feedback.append(FeedbackItem(
-                category="energy",
-                message="Put more energy into your movements! Go bigger and stronger.",
-                severity="info",
-                timestamp=None
-            ))
+            feedback.append(_FEEDBACK_ENERGY_LOW)
         elif movement_metrics.energy_score > 0.9:
-            feedback.append(FeedbackItem(
-                category="energy",
-                message="Great energy! Keep up that intensity.",
-                severity="info",
-                timestamp=None
-            ))
+            feedback.append(_FEEDBACK_ENERGY_HIGH)
         
         # Form feedback
         if movement_metrics.form_score < 0.7:
-            feedback.append(FeedbackItem(
-                category="form",
-                message="Pay attention to your posture and alignment. Keep your core engaged.",
-                severity="warning",
-                timestamp=None
-            ))
+            feedback.append(_FEEDBACK_FORM)
         
         # Accuracy feedback
         if movement_metrics.accuracy_score < 0.7:
-            feedback.append(FeedbackItem(
-                category="accuracy",
-                message="Your movements are inconsistent. Try to replicate the reference motion more precisely.",
-                severity="warning",
-                timestamp=None
-            ))
+            feedback.append(_FEEDBACK_ACCURACY)
         
         # Overall positive feedback if no issues
         if not feedback:
-            feedback.append(FeedbackItem(
-                category="overall",
-                message="Outstanding performance! All metrics look great.",
-                severity="info",
-                timestamp=None
-            ))
+            feedback.append(_FEEDBACK_OVERALL)
         
         return feedback
     
-    def _calculate_velocities(self, frames: List[Frame]) -> np.ndarray:
-        """Calculate velocities between frames."""
-        if len(frames) < 2:
-            return np.array([0.0])
-        
-        velocities = []
-        for i in range(1, len(frames)):
-            dt = frames[i].timestamp - frames[i-1].timestamp
-            if dt <= 0:
-                dt = 0.033  # Default to ~30fps
-            
-            # Calculate average keypoint displacement
-            displacement = 0.0
-            count = 0
-            for j, kp_curr in enumerate(frames[i].keypoints):
-                if j < len(frames[i-1].keypoints):
-                    kp_prev = frames[i-1].keypoints[j]
-                    dx = kp_curr.x - kp_prev.x
-                    dy = kp_curr.y - kp_prev.y
-                    dz = (kp_curr.z or 0) - (kp_prev.z or 0)
-                    displacement += np.sqrt(dx**2 + dy**2 + dz**2)
-                    count += 1
-            
-            avg_displacement = displacement / max(count, 1)
-            velocity = avg_displacement / dt
-            velocities.append(velocity)
+    def _pack_frames(self, frames: List[Frame]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Pack frames into contiguous arrays.
         
-        return np.array(velocities)
+        Frames with fewer keypoints than the longest frame are padded with NaN,
+        so downstream reductions can tell missing joints apart from real ones.
+        
+        Returns:
+            Tuple of (coords [F, K, 3], timestamps [F], confidences [F, K])
+            
+        Raises:
+            MotionPayloadError: If padding would make the arrays much larger
+                than the keypoints in the frames, or a coordinate is not finite
+        """
+        timestamps = [frame.timestamp for frame in frames]
+        counts = [len(frame.keypoints) for frame in frames]
+        check_keypoint_padding(counts)
+        flat = np.array(
+            [
+                (kp.x, kp.y, kp.z, kp.confidence)
+                for frame in frames
+                for kp in frame.keypoints
+            ],
+            dtype=np.float64
+        )
+        return pack_keypoints(timestamps, counts, flat)
     
-    def _calculate_accelerations(self, velocities: np.ndarray) -> np.ndarray:
-        """Calculate accelerations from velocities."""
-        if len(velocities) < 2:
-            return np.array([0.0])
-        return np.diff(velocities)
+    def _calculate_velocities(self, coords: np.ndarray, ts: np.ndarray) -> np.ndarray:
+        """Calculate velocities between frames."""
+        if len(coords) < 2:
+            return np.zeros(1)
+        
+        return compute_velocities(coords, ts)
     
-    def _detect_movement_peaks(self, velocities: np.ndarray, threshold_percentile: float = 75) -> List[float]:
-        """Detect peaks in movement velocity."""
+    def _detect_movement_peaks(
+        self,
+        velocities: np.ndarray,
+        ts: np.ndarray,
+        threshold_percentile: float = 75
+    ) -> np.ndarray:
+        """Detect peaks in movement velocity, returned as frame timestamps."""
         if len(velocities) < 3:
-            return []
-        
-        threshold = np.percentile(velocities, threshold_percentile)
-        peaks = []
+            return np.empty(0)
         
-        for i in range(1, len(velocities) - 1):
-            if velocities[i] > threshold and velocities[i] > velocities[i-1] and velocities[i] > velocities[i+1]:
-                # Approximate timestamp based on frame index
-                peaks.append(i * 0.033)  # Assume 30fps
+        threshold = _percentile(velocities, threshold_percentile)
+        inner = velocities[1:-1]
+        mask = (inner > threshold) & (inner > velocities[:-2]) & (inner > velocities[2:])
         
-        return peaks
+        # Velocity i spans frames i and i+1; report the peak at frame i
+        return ts[1:len(velocities) - 1][mask]
     
-    def _calculate_smoothness(self, accelerations: np.ndarray) -> float:
-        """Calculate smoothness score (0-1, higher is smoother)."""
-        if len(accelerations) == 0:
-            return 1.0
+    def _movement_stats(self, velocities: np.ndarray) -> Tuple[float, float]:
+        """Calculate smoothness and energy scores (0-1) from one pass over velocities."""
+        avg_velocity, variance = velocity_stats(velocities)
         
-        # Lower variance in acceleration = smoother movement
-        variance = np.var(accelerations)
+        # Smoothness: lower variance in acceleration = smoother movement
         # Normalize: assume variance > 100 is very jerky
         smoothness = 1.0 / (1.0 + variance / 100.0)
-        return float(np.clip(smoothness, 0.0, 1.0))
-    
-    def _calculate_energy(self, velocities: np.ndarray) -> float:
-        """Calculate energy score (0-1)."""
-        if len(velocities) == 0:
-            return 0.5
         
-        avg_velocity = np.mean(velocities)
+        # Energy: average velocity magnitude
         # Normalize: assume velocity > 10 is high energy
         energy = avg_velocity / 10.0
-        return float(np.clip(energy, 0.0, 1.0))
+        
+        return _clip(smoothness, 0.0, 1.0), _clip(energy, 0.0, 1.0)
     
-    def _calculate_accuracy(self, frames: List[Frame]) -> float:
+    def _calculate_accuracy(self, coords: np.ndarray) -> float:
         """Calculate accuracy score based on consistency."""
-        if len(frames) < 2:
+        if len(coords) < 2:
             return 1.0
         
         # Calculate consistency in keypoint positions relative to body center
-        consistency_scores = []
-        
-        for i in range(len(frames)):
-            keypoints = frames[i].keypoints
-            if len(keypoints) == 0:
-                continue
-            
-            # Calculate body center
-            center_x = np.mean([kp.x for kp in keypoints])
-            center_y = np.mean([kp.y for kp in keypoints])
-            
-            # Calculate normalized distances
-            distances = []
-            for kp in keypoints:
-                dist = np.sqrt((kp.x - center_x)**2 + (kp.y - center_y)**2)
-                distances.append(dist)
-            
-            if distances:
-                consistency_scores.append(np.std(distances))
-        
-        if not consistency_scores:
+        xy = coords[..., :2]
+        xy = xy[~np.isnan(xy[..., 0]).all(axis=1)]
+        if len(xy) == 0:
             return 1.0
         
+        centers = np.nanmean(xy, axis=1, keepdims=True)
+        distances = np.linalg.norm(xy - centers, axis=2)
+        consistency_scores = np.nanstd(distances, axis=1)
+        
         # Lower variation in body structure = higher accuracy
         avg_std = np.mean(consistency_scores)
         accuracy = 1.0 / (1.0 + avg_std)
-        return float(np.clip(accuracy, 0.0, 1.0))
+        return _clip(accuracy, 0.0, 1.0)
     
-    def _calculate_form(self, frames: List[Frame]) -> float:
+    def _calculate_form(self, conf: np.ndarray) -> float:
         """Calculate form score based on posture quality."""
-        if len(frames) == 0:
+        if len(conf) == 0:
             return 1.0
         
-        form_scores = []
+        # Check confidence levels (proxy for detection quality), averaged per frame
+        has_conf = ~np.isnan(conf)
+        counts = has_conf.sum(axis=1)
+        scored = counts > 0
         
-        for frame in frames:
-            keypoints = frame.keypoints
-            if len(keypoints) == 0:
-                continue
-            
-            # Check confidence levels (proxy for detection quality)
-            confidences = [kp.confidence for kp in keypoints if kp.confidence is not None]
-            if confidences:
-                avg_confidence = np.mean(confidences)
-                form_scores.append(avg_confidence)
-        
-        if not form_scores:
+        if not scored.any():
             # If no confidence data, use a heuristic based on keypoint spread
             return 0.8
         
-        return float(np.clip(np.mean(form_scores), 0.0, 1.0))
+        form_scores = np.where(has_conf, conf, 0.0).sum(axis=1)[scored] / counts[scored]
+        return _clip(form_scores.mean(), 0.0, 1.0)
     
     def calculate_overall_score(
         self, 
@@ -315,15 +339,7 @@ class MotionAnalyzer:
         movement_metrics: MovementMetrics
     ) -> float:
         """Calculate overall performance score (0-100)."""
-        # Weighted combination of metrics
-        weights = {
-            'timing': 0.25,
-            'smoothness': 0.20,
-            'accuracy': 0.25,
-            'energy': 0.15,
-            'form': 0.15
-        }
-        
+        weights = self._WEIGHTS
         score = (
             weights['timing'] * timing_metrics.sync_score +
             weights['smoothness'] * movement_metrics.smoothness_score +
@@ -332,4 +348,4 @@ class MotionAnalyzer:
             weights['form'] * movement_metrics.form_score
         ) * 100.0
         
-        return float(np.clip(score, 0.0, 100.0))
+        return _clip(score, 0.0, 100.0)
@@ -1,4 +1,5 @@
 """Configuration management for the AI service."""
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 from pydantic import ConfigDict
 
@@ -16,6 +17,7 @@ class Settings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 8000
     ai_service_url: str = "http://localhost:8000"
+    debug: bool = False
     
     # Model Configuration
     model_version: str = "1.0.0"
@@ -26,4 +28,7 @@ class Settings(BaseSettings):
     timeout_seconds: int = 5
 
 
-settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    """Return application settings, reading the environment and .env only once."""
+    return Settings()
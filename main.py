@@ -1,24 +1,37 @@
 """FastAPI service for motion data prediction."""
+import email.message
 import time
-from fastapi import FastAPI, HTTPException, status
+from typing import Any, Dict, Optional
+import orjson
+from fastapi import Depends, FastAPI, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.openapi.constants import REF_PREFIX
+from fastapi.openapi.utils import validation_error_definition, validation_error_response_definition
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 
 from models import MotionData, PredictionResult
+from payload import MotionPayloadError, PackedMotion, parse_motion_payload
 from analyzer import MotionAnalyzer
-from config import settings
+from _kernels import warm_up
+from config import get_settings
 
 
 # Initialize analyzer
-analyzer = MotionAnalyzer(scoring_threshold=settings.scoring_threshold)
+analyzer = MotionAnalyzer(scoring_threshold=get_settings().scoring_threshold)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup/shutdown events."""
     # Startup
+    settings = get_settings()
     print(f"Starting AI service on {settings.host}:{settings.port}")
     print(f"Model version: {settings.model_version}")
+    # Compile kernels up front so the first request doesn't pay for it
+    warm_up()
     yield
     # Shutdown
     print("Shutting down AI service")
@@ -28,7 +41,8 @@ async def lifespan(app: FastAPI):
 app = FastAPI(
     title="StepFlow AI Service",
     description="AI/ML pipeline for motion data analysis and coaching feedback",
-    version=settings.model_version,
+    version=get_settings().model_version,
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -47,7 +61,7 @@ async def root():
     """Root endpoint."""
     return {
         "service": "StepFlow AI",
-        "version": settings.model_version,
+        "version": get_settings().model_version,
         "status": "running"
     }
 
@@ -58,17 +72,89 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "stepflow-ai",
-        "version": settings.model_version
+        "version": get_settings().model_version
     }
 
 
-@app.post("/predict", response_model=PredictionResult)
-async def predict(motion_data: MotionData):
+def _is_json_content_type(content_type: Optional[str]) -> bool:
+    """Check a Content-Type header the way FastAPI does for JSON bodies."""
+    if not content_type:
+        # FastAPI parses bodies without a Content-Type as JSON
+        return True
+    message = email.message.Message()
+    message["content-type"] = content_type
+    subtype = message.get_content_subtype()
+    return message.get_content_maintype() == "application" and (
+        subtype == "json" or subtype.endswith("+json")
+    )
+
+
+def _decode_motion_payload(body: bytes) -> PackedMotion:
+    """Decode and pack a JSON body, reporting problems as validation errors."""
+    try:
+        return parse_motion_payload(orjson.loads(body))
+    except orjson.JSONDecodeError as e:
+        raise RequestValidationError([
+            {"type": "json_invalid", "loc": ("body", e.pos), "msg": "JSON decode error", "ctx": {"error": e.msg}}
+        ])
+    except MotionPayloadError as e:
+        raise RequestValidationError([
+            {"type": e.error_type, "loc": ("body",) + e.loc, "msg": str(e)}
+        ])
+
+
+async def read_motion_payload(request: Request) -> PackedMotion:
+    """
+    Parse the request body straight into packed motion arrays.
+    
+    Skips FastAPI's per-field Pydantic validation of MotionData; the same
+    checks run vectorized in parse_motion_payload. Errors are reported as
+    422 validation errors, like a regular request body. Only JSON content
+    types are accepted, so cross-site "simple" form or text POSTs are still
+    rejected.
+    """
+    body = await request.body()
+    if not body:
+        raise RequestValidationError([
+            {"type": "missing", "loc": ("body",), "msg": "Field required", "input": None}
+        ])
+    if not _is_json_content_type(request.headers.get("content-type")):
+        raise RequestValidationError([
+            {
+                "type": "model_attributes_type",
+                "loc": ("body",),
+                "msg": "Input should be a valid dictionary or object to extract fields from",
+                "input": body.decode("utf-8", "replace")
+            }
+        ])
+    # Decoding and packing walk every keypoint, so keep them off the event loop
+    return await run_in_threadpool(_decode_motion_payload, body)
+
+
+@app.post(
+    "/predict",
+    response_model=PredictionResult,
+    # Declared by hand: the body is read in a dependency, so FastAPI sees no
+    # body parameter and wouldn't add its usual 422 response
+    responses={
+        422: {
+            "description": "Validation Error",
+            "content": {"application/json": {"schema": {"$ref": REF_PREFIX + "HTTPValidationError"}}}
+        }
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": {"$ref": "#/components/schemas/MotionData"}}}
+        }
+    }
+)
+async def predict(motion_data: PackedMotion = Depends(read_motion_payload)):
     """
     Predict motion performance and generate coaching feedback.
     
     Args:
-        motion_data: Input motion data containing frames with keypoints
+        motion_data: Input motion data (MotionData schema), packed into arrays
         
     Returns:
         PredictionResult with scores, metrics, and feedback
@@ -81,14 +167,14 @@ async def predict(motion_data: MotionData):
         start_time = time.perf_counter()
         
         # Validate input
-        if not motion_data.frames:
+        if len(motion_data.ts) == 0:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Motion data must contain at least one frame"
             )
         
-        # Analyze motion data
-        timing_metrics, movement_metrics, feedback = analyzer.analyze(motion_data)
+        # Analyze motion data off the event loop (CPU-bound)
+        timing_metrics, movement_metrics, feedback = await run_in_threadpool(analyzer.analyze, motion_data)
         
         # Calculate overall score
         overall_score = analyzer.calculate_overall_score(timing_metrics, movement_metrics)
@@ -117,12 +203,44 @@ async def predict(motion_data: MotionData):
         )
 
 
+_build_openapi = app.openapi
+
+
+def openapi() -> Dict[str, Any]:
+    """Build the OpenAPI schema, documenting MotionData as the /predict body."""
+    if app.openapi_schema is None:
+        schema = _build_openapi()
+        motion_schema = MotionData.model_json_schema(ref_template=REF_PREFIX + "{model}")
+        components = schema.setdefault("components", {}).setdefault("schemas", {})
+        components.update(motion_schema.pop("$defs", {}))
+        components["MotionData"] = motion_schema
+        components.setdefault("ValidationError", validation_error_definition)
+        components.setdefault("HTTPValidationError", validation_error_response_definition)
+    return app.openapi_schema
+
+
+app.openapi = openapi
+
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(
-        "main:app",
-        host=settings.host,
-        port=settings.port,
-        reload=True,
-        log_level="info"
-    )
+    settings = get_settings()
+    if settings.debug:
+        # Single auto-reloading worker for development
+        uvicorn.run(
+            "main:app",
+            host=settings.host,
+            port=settings.port,
+            reload=True,
+            log_level="info"
+        )
+    else:
+        uvicorn.run(
+            "main:app",
+            host=settings.host,
+            port=settings.port,
+            workers=settings.max_workers,
+            loop="uvloop",
+            http="httptools",
+            log_level="warning"
+        )
@@ -1,5 +1,5 @@
 """Data models for the AI service."""
-from typing import List, Dict, Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field, field_validator
 
 
@@ -40,7 +40,7 @@ class MotionData(BaseModel):
 
 class TimingMetrics(BaseModel):
     """Timing analysis results."""
-    avg_lag_ms: float = Field(..., description="Average lag in milliseconds")
+    avg_lag_ms: float = Field(..., ge=0.0, description="Average lag in milliseconds")
     sync_score: float = Field(..., ge=0.0, le=1.0, description="Synchronization score")
     on_beat_percentage: float = Field(..., ge=0.0, le=100.0, description="Percentage of moves on beat")
 
@@ -67,4 +67,4 @@ class PredictionResult(BaseModel):
     timing_metrics: TimingMetrics = Field(..., description="Timing analysis results")
     movement_metrics: MovementMetrics = Field(..., description="Movement quality metrics")
     feedback: List[FeedbackItem] = Field(..., description="Coaching feedback items")
-    processing_time_ms: float = Field(..., description="Processing time in milliseconds")
+    processing_time_ms: float = Field(..., ge=0.0, description="Processing time in milliseconds")
@@ -0,0 +1,237 @@
+"""Validation and packing of motion payloads into NumPy arrays."""
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple, Union
+import numpy as np
+
+
+class PackedMotion(NamedTuple):
+    """Motion data packed into arrays, as produced by parse_motion_payload."""
+    coords: np.ndarray
+    ts: np.ndarray
+    conf: np.ndarray
+    audio_bpm: Optional[float] = None
+    reference_motion: Optional[str] = None
+
+
+class MotionPayloadError(ValueError):
+    """Invalid motion payload, with the location of the offending field."""
+    
+    def __init__(self, message: str, loc: Tuple[Union[str, int], ...] = (), error_type: str = "value_error"):
+        super().__init__(message)
+        self.loc = loc
+        self.error_type = error_type
+
+
+def pack_keypoints(
+    timestamps: Sequence[float],
+    counts: Sequence[int],
+    flat: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pack flat keypoint rows into contiguous per-frame arrays.
+    
+    Args:
+        timestamps: Timestamp of each frame
+        counts: Number of keypoints in each frame
+        flat: [N, 4] array of (x, y, z, confidence) rows, frame by frame,
+            with NaN z treated as 0 and NaN confidence as missing
+        
+    Returns:
+        Tuple of (coords [F, K, 3], timestamps [F], confidences [F, K]), with
+        frames shorter than the longest one padded with NaN
+        
+    Raises:
+        MotionPayloadError: If a coordinate is not finite, located at the
+            offending keypoint field
+    """
+    ts = np.asarray(timestamps, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.intp)
+    flat = np.asarray(flat, dtype=np.float64).reshape(-1, 4)
+    
+    # NaN z means "not given", but x and y are required
+    bad_xy = ~np.isfinite(flat[:, :2])
+    if bad_xy.any():
+        row, col = divmod(int(bad_xy.argmax()), 2)
+        raise MotionPayloadError(
+            "Keypoint coordinates must be finite numbers", _keypoint_loc(counts, row, 'xy'[col])
+        )
+    bad_z = np.isinf(flat[:, 2])
+    if bad_z.any():
+        raise MotionPayloadError(
+            "Keypoint coordinates must be finite numbers", _keypoint_loc(counts, int(bad_z.argmax()), 'z')
+        )
+    
+    # Row-major boolean scatter keeps keypoints in their original order
+    present = np.arange(counts.max(initial=0)) < counts[:, None]
+    coords = np.full(present.shape + (3,), np.nan)
+    coords[present] = flat[:, :3]
+    coords[..., 2][present] = np.nan_to_num(flat[:, 2], nan=0.0)
+    conf = np.full(present.shape, np.nan)
+    conf[present] = flat[:, 3]
+    
+    return coords, ts, conf
+
+
+# Frames are padded to the longest one when packed, so a single long frame
+# among many short ones would make the arrays far larger than the request.
+# Padding may grow them by at most this factor, beyond a small allowance.
+_MAX_PADDING_FACTOR = 8
+_PADDING_ALLOWANCE = 65536
+
+
+def check_keypoint_padding(counts: Sequence[int]) -> None:
+    """
+    Check that padding frames to the longest one keeps the packed size bounded.
+    
+    Args:
+        counts: Number of keypoints in each frame
+        
+    Raises:
+        MotionPayloadError: If the padded arrays would be much larger than the
+            keypoints actually sent, located at the longest frame
+    """
+    longest = max(counts)
+    if len(counts) * longest > max(_MAX_PADDING_FACTOR * sum(counts), _PADDING_ALLOWANCE):
+        raise MotionPayloadError(
+            "Keypoint counts vary too much between frames",
+            ('frames', list(counts).index(longest), 'keypoints')
+        )
+
+
+def _is_number(value: Any) -> bool:
+    """Check that a JSON value converts to a float the way the packer converts it."""
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def _locate_frame_error(frames: List[Any]) -> MotionPayloadError:
+    """
+    Find the first malformed frame or keypoint.
+    
+    Only called once the vectorized packing has failed, so the per-keypoint
+    walk costs nothing for valid payloads.
+    """
+    for i, frame in enumerate(frames):
+        loc = ('frames', i)
+        if not isinstance(frame, dict):
+            return MotionPayloadError("Frame must be an object", loc)
+        if 'timestamp' not in frame:
+            return MotionPayloadError("Field required", loc + ('timestamp',), "missing")
+        if not _is_number(frame['timestamp']):
+            return MotionPayloadError("timestamp must be a number", loc + ('timestamp',))
+        if 'keypoints' not in frame:
+            return MotionPayloadError("Field required", loc + ('keypoints',), "missing")
+        keypoints = frame['keypoints']
+        if not isinstance(keypoints, list):
+            return MotionPayloadError("keypoints must be a list of objects", loc + ('keypoints',))
+        for j, kp in enumerate(keypoints):
+            kp_loc = loc + ('keypoints', j)
+            if not isinstance(kp, dict):
+                return MotionPayloadError("Keypoint must be an object", kp_loc)
+            for field in ('x', 'y'):
+                if field not in kp:
+                    return MotionPayloadError("Field required", kp_loc + (field,), "missing")
+            for field in ('x', 'y', 'z', 'confidence'):
+                value = kp.get(field)
+                if (value is not None or field in ('x', 'y')) and not _is_number(value):
+                    return MotionPayloadError(f"{field} must be a number", kp_loc + (field,))
+    return MotionPayloadError("Invalid frame data", ('frames',))
+
+
+def _keypoint_loc(counts: Sequence[int], row: int, field: str) -> Tuple[Union[str, int], ...]:
+    """Map a row of the flat keypoint array back to its frame and keypoint index."""
+    offsets = np.cumsum(counts)
+    i = int(np.searchsorted(offsets, row, side='right'))
+    j = row - (int(offsets[i - 1]) if i else 0)
+    return ('frames', i, 'keypoints', j, field)
+
+
+def parse_motion_payload(payload: Any) -> PackedMotion:
+    """
+    Validate a decoded JSON payload and pack it into arrays.
+    
+    Accepts the same shape as MotionData, but checks the keypoints with a few
+    vectorized passes instead of building a KeyPoint/Frame model per joint.
+    
+    Args:
+        payload: Decoded JSON request body
+        
+    Returns:
+        PackedMotion with (coords [F, K, 3], timestamps [F], confidences [F, K])
+        
+    Raises:
+        MotionPayloadError: If the payload does not describe valid motion data,
+            located at the offending field
+    """
+    if not isinstance(payload, dict):
+        raise MotionPayloadError("Motion data must be a JSON object")
+    
+    if 'frames' not in payload:
+        raise MotionPayloadError("Field required", ('frames',), "missing")
+    frames = payload['frames']
+    if not isinstance(frames, list):
+        raise MotionPayloadError("frames must be a list of objects", ('frames',))
+    if len(frames) == 0:
+        raise MotionPayloadError("Motion data must contain at least one frame", ('frames',))
+    
+    audio_bpm = payload.get('audio_bpm')
+    if audio_bpm is not None:
+        if not _is_number(audio_bpm):
+            raise MotionPayloadError("audio_bpm must be a number", ('audio_bpm',))
+        audio_bpm = float(audio_bpm)
+        if not audio_bpm > 0:
+            raise MotionPayloadError("audio_bpm must be greater than 0", ('audio_bpm',))
+    
+    reference_motion = payload.get('reference_motion')
+    if reference_motion is not None and not isinstance(reference_motion, str):
+        raise MotionPayloadError("reference_motion must be a string", ('reference_motion',))
+    
+    try:
+        timestamps = np.asarray([frame['timestamp'] for frame in frames], dtype=np.float64)
+        counts = [len(frame['keypoints']) for frame in frames]
+        # The trailing column flags missing confidences, which would otherwise
+        # be indistinguishable from explicit NaNs once converted
+        rows = np.asarray(
+            [
+                (kp['x'], kp['y'], kp.get('z'), kp.get('confidence'), kp.get('confidence') is None)
+                for frame in frames
+                for kp in frame['keypoints']
+            ],
+            dtype=np.float64
+        )
+    except (KeyError, TypeError, ValueError, AttributeError):
+        raise _locate_frame_error(frames) from None
+    
+    if min(counts) == 0:
+        raise MotionPayloadError(
+            "Frame must contain at least one keypoint", ('frames', counts.index(0), 'keypoints')
+        )
+    # Uniformly list-valued fields convert without error but add a dimension
+    if timestamps.ndim != 1 or rows.ndim != 2 or rows.shape[1] != 5:
+        raise _locate_frame_error(frames)
+    flat, missing_conf = rows[:, :4], rows[:, 4] != 0.0
+    
+    bad_ts = ~np.isfinite(timestamps)
+    if bad_ts.any():
+        raise MotionPayloadError(
+            "timestamp must be a finite number", ('frames', int(bad_ts.argmax()), 'timestamp')
+        )
+    bad_order = np.diff(timestamps) <= 0
+    if bad_order.any():
+        raise MotionPayloadError(
+            "timestamps must be strictly increasing", ('frames', int(bad_order.argmax()) + 1, 'timestamp')
+        )
+    
+    # Written so NaN fails too; only a missing confidence may be NaN
+    bad_conf = ~(((flat[:, 3] >= 0.0) & (flat[:, 3] <= 1.0)) | missing_conf)
+    if bad_conf.any():
+        raise MotionPayloadError(
+            "Keypoint confidence must be between 0 and 1",
+            _keypoint_loc(counts, int(bad_conf.argmax()), 'confidence')
+        )
+    
+    check_keypoint_padding(counts)
+    coords, ts, conf = pack_keypoints(timestamps, counts, flat)
+    return PackedMotion(coords, ts, conf, audio_bpm, reference_motion)
@@ -0,0 +1,239 @@
+"""Shared fixtures for the AI service test suite."""
+import numpy as np
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+from models import MotionData
+
+
+def _frames(xs, ys, confidence, zs=None):
+    """
+    Build 30fps frame dicts from [F, K] keypoint arrays.
+    
+    Coordinates are computed with NumPy broadcasting and converted to Python
+    floats with a single tolist() per column.
+    """
+    columns = np.broadcast_arrays(*([xs, ys, confidence] if zs is None else [xs, ys, zs, confidence]))
+    keys = ("x", "y", "confidence") if zs is None else ("x", "y", "z", "confidence")
+    return [
+        {"timestamp": i * 0.033, "keypoints": [dict(zip(keys, kp)) for kp in zip(*rows)]}
+        for i, rows in enumerate(zip(*(column.tolist() for column in columns)))
+    ]
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Test client shared by the whole session; runs app startup/shutdown once."""
+    # Entered once, so every request reuses the same portal/event-loop thread
+    # rather than starting one per call. httpx's ASGITransport is async-only
+    # and can't back a sync httpx.Client, so TestClient stays.
+    # Imported here so collection (and runs that never request the client)
+    # don't pay for loading the analyzer and its numba kernels.
+    from main import app
+    
+    with TestClient(app) as c:
+        yield c
+
+
+def _encode(payload):
+    """
+    Serialize a request body once, so tests skip httpx's per-request JSON encoding.
+    
+    The payload is validated as MotionData first, so fixtures can't drift
+    from the request schema, then encoded with orjson like the inline bodies
+    in the tests.
+    """
+    MotionData.model_validate(payload)
+    return orjson.dumps(payload)
+
+
+@pytest.fixture(scope="session")
+def basic_motion_bytes():
+    """Five frames of two 3D keypoints moving together."""
+    return _encode({
+        "frames": [
+            {
+                "timestamp": 0.0,
+                "keypoints": [
+                    {"x": 0.5, "y": 0.5, "z": 0.0, "confidence": 0.9},
+                    {"x": 0.6, "y": 0.4, "z": 0.0, "confidence": 0.85}
+                ]
+            },
+            {
+                "timestamp": 0.033,
+                "keypoints": [
+                    {"x": 0.52, "y": 0.52, "z": 0.0, "confidence": 0.92},
+                    {"x": 0.62, "y": 0.42, "z": 0.0, "confidence": 0.88}
+                ]
+            },
+            {
+                "timestamp": 0.066,
+                "keypoints": [
+                    {"x": 0.54, "y": 0.54, "z": 0.0, "confidence": 0.91},
+                    {"x": 0.64, "y": 0.44, "z": 0.0, "confidence": 0.87}
+                ]
+            },
+            {
+                "timestamp": 0.099,
+                "keypoints": [
+                    {"x": 0.56, "y": 0.56, "z": 0.0, "confidence": 0.90},
+                    {"x": 0.66, "y": 0.46, "z": 0.0, "confidence": 0.86}
+                ]
+            },
+            {
+                "timestamp": 0.132,
+                "keypoints": [
+                    {"x": 0.58, "y": 0.58, "z": 0.0, "confidence": 0.89},
+                    {"x": 0.68, "y": 0.48, "z": 0.0, "confidence": 0.85}
+                ]
+            }
+        ]
+    })
+
+
+@pytest.fixture(scope="session")
+def bpm_motion_bytes():
+    """One keypoint swinging on every beat of a 120 BPM track."""
+    return _encode({
+        "frames": [
+            {
+                "timestamp": 0.0,
+                "keypoints": [{"x": 0.5, "y": 0.5, "confidence": 0.9}]
+            },
+            {
+                "timestamp": 0.5,
+                "keypoints": [{"x": 0.6, "y": 0.6, "confidence": 0.9}]
+            },
+            {
+                "timestamp": 1.0,
+                "keypoints": [{"x": 0.5, "y": 0.5, "confidence": 0.9}]
+            },
+            {
+                "timestamp": 1.5,
+                "keypoints": [{"x": 0.6, "y": 0.6, "confidence": 0.9}]
+            }
+        ],
+        "audio_bpm": 120.0
+    })
+
+
+@pytest.fixture(scope="session")
+def offset_bpm_motion_bytes():
+    """
+    Two seconds at 50fps starting at t=1s, with a 120 BPM track.
+    
+    The keypoint holds still except for jumps starting at 1.5s, 2.04s, 2.5s
+    and 2.76s: two on the beat, one 40ms late and one 240ms late.
+    """
+    jumps = np.zeros(100)
+    jumps[[25, 52, 75, 88]] = 0.05
+    x = 0.3 + np.concatenate([[0.0], np.cumsum(jumps[:-1])])
+    return _encode({
+        "frames": [
+            {"timestamp": 1.0 + i * 0.02, "keypoints": [{"x": float(xi), "y": 0.5, "confidence": 0.9}]}
+            for i, xi in enumerate(x)
+        ],
+        "audio_bpm": 120.0
+    })
+
+
+@pytest.fixture(scope="session")
+def single_frame_bytes():
+    """A single frame with one keypoint."""
+    return _encode({
+        "frames": [
+            {
+                "timestamp": 0.0,
+                "keypoints": [{"x": 0.5, "y": 0.5, "confidence": 0.9}]
+            }
+        ]
+    })
+
+
+@pytest.fixture(scope="session")
+def missing_confidence_bytes():
+    """Two frames of keypoints without confidence values."""
+    return _encode({
+        "frames": [
+            {
+                "timestamp": 0.0,
+                "keypoints": [{"x": 0.5, "y": 0.5}]
+            },
+            {
+                "timestamp": 0.033,
+                "keypoints": [{"x": 0.52, "y": 0.52}]
+            }
+        ]
+    })
+
+
+@pytest.fixture(scope="session")
+def keypoints_2d_bytes():
+    """Five frames of a 2D keypoint (no z coordinate)."""
+    i = np.arange(5)[:, None]
+    return _encode({"frames": _frames(0.5 + i * 0.01, 0.5 + i * 0.01, 0.9)})
+
+
+@pytest.fixture(scope="session")
+def keypoints_3d_bytes():
+    """Five frames of a 3D keypoint."""
+    i = np.arange(5)[:, None]
+    return _encode({"frames": _frames(0.5 + i * 0.01, 0.5 + i * 0.01, 0.9, zs=1.0 + i * 0.01)})
+
+
+@pytest.fixture(scope="session")
+def high_energy_motion_bytes():
+    """Two keypoints moving fast across 10 frames."""
+    i = np.arange(10)[:, None]
+    return _encode({
+        "frames": _frames(
+            np.hstack([0.5 + i * 0.1, 0.3 - i * 0.05]),
+            np.hstack([0.5 + i * 0.1, 0.7 + i * 0.05]),
+            [0.9, 0.85]
+        )
+    })
+
+
+@pytest.fixture(scope="session")
+def smooth_motion_bytes():
+    """Two keypoints drifting steadily across 20 frames."""
+    i = np.arange(20)[:, None]
+    return _encode({
+        "frames": _frames(
+            np.hstack([0.5 + i * 0.01, 0.6 + i * 0.01]),
+            np.hstack([0.5 + i * 0.01, 0.4 + i * 0.01]),
+            0.95
+        )
+    })
+
+
+@pytest.fixture(scope="session")
+def jerky_motion_bytes():
+    """One keypoint jumping back and forth every frame."""
+    swing = 0.5 + (-1.0) ** np.arange(10)[:, None] * 0.2
+    return _encode({"frames": _frames(swing, swing, 0.8)})
+
+
+@pytest.fixture(scope="session")
+def full_body_motion_bytes():
+    """Two frames of 17 keypoints (typical pose estimation output)."""
+    i = np.arange(2)[:, None]
+    j = np.arange(17)
+    return _encode({"frames": _frames(0.5 + j * 0.05 + i * 0.01, 0.5 + j * 0.03 + i * 0.01, 0.9)})
+
+
+@pytest.fixture(scope="session")
+def latency_motion_bytes():
+    """One second of 17-keypoint motion at 30fps."""
+    i = np.arange(30)[:, None]
+    position = np.broadcast_to(0.5 + i * 0.01, (30, 17))
+    return _encode({"frames": _frames(position, position, 0.9)})
+
+
+@pytest.fixture(scope="session")
+def long_motion_bytes():
+    """About 3 seconds of repeating motion with a 128 BPM track."""
+    i = np.arange(100)[:, None]
+    position = 0.5 + (i % 20) * 0.01
+    return _encode({"frames": _frames(position, position, 0.9), "audio_bpm": 128.0})
@@ -0,0 +1,96 @@
+"""Tests for the motion analyzer internals."""
+import numpy as np
+import pytest
+
+from models import MotionData
+from payload import MotionPayloadError, parse_motion_payload
+
+
+@pytest.fixture(scope="module")
+def analyzer_module():
+    """The analyzer module, imported on first use so collection doesn't load numba."""
+    import analyzer
+    return analyzer
+
+
+class TestPercentile:
+    """Test the partition-based percentile used for peak thresholds."""
+    
+    @pytest.mark.parametrize("n", [1, 2, 3, 4, 5, 6, 7, 30, 99, 100, 101, 1000])
+    def test_matches_numpy(self, analyzer_module, n):
+        """Test that the threshold equals np.percentile exactly, not approximately."""
+        rng = np.random.default_rng(n)
+        for scale in (1.0, 10.0, 1000.0):
+            values = (rng.random(n) * scale).astype(np.float32)
+            for q in (0, 25, 50, 75, 90, 100):
+                assert analyzer_module._percentile(values, q) == np.percentile(values, q)
+    
+    def test_matches_numpy_with_ties(self, analyzer_module):
+        """Test repeated values, as produced by keypoints holding still."""
+        values = np.array([0.0, 0.0, 0.0, 1.5, 1.5, 0.0, 2.0, 0.0], dtype=np.float32)
+        assert analyzer_module._percentile(values, 75) == np.percentile(values, 75)
+
+
+class TestFramePacking:
+    """Test packing MotionData frames into arrays."""
+    
+    def test_frame_models_match_packed_input(self, analyzer_module):
+        """Test that MotionData input scores exactly like the same payload packed directly."""
+        payload = {
+            "frames": [
+                {
+                    "timestamp": i * 0.02,
+                    "keypoints": [
+                        {"x": 0.5 + 0.01 * i * j, "y": 0.5 - 0.01 * j, "confidence": 0.5 + 0.05 * j}
+                        if j % 2 else {"x": 0.4 + 0.01 * i, "y": 0.3 * j, "z": 0.1 * i}
+                        for j in range(5 - i % 2)
+                    ]
+                }
+                for i in range(12)
+            ],
+            "audio_bpm": 120.0
+        }
+        analyzer = analyzer_module.MotionAnalyzer()
+        
+        result = analyzer.analyze(MotionData(**payload))
+        expected = analyzer.analyze(parse_motion_payload(payload))
+        
+        assert [item.model_dump() for item in result[:2]] == [item.model_dump() for item in expected[:2]]
+        assert result[2] == expected[2]
+    
+    def test_ragged_keypoint_counts_rejected(self, analyzer_module):
+        """Test that one huge frame among many tiny ones is rejected instead of padded."""
+        motion = MotionData(frames=[
+            {"timestamp": i * 0.033, "keypoints": [{"x": 0.5, "y": 0.5}] * (5000 if i == 1 else 1)}
+            for i in range(1000)
+        ])
+        
+        with pytest.raises(MotionPayloadError) as excinfo:
+            analyzer_module.MotionAnalyzer().analyze(motion)
+        assert excinfo.value.loc == ("frames", 1, "keypoints")
+    
+    def test_large_coordinates_scored(self, analyzer_module):
+        """Test that coordinates beyond float32 range are scored, not overflowed to NaN."""
+        motion = MotionData(frames=[
+            {"timestamp": i * 0.033, "keypoints": [{"x": 1e39 * (-1) ** i, "y": 0.5, "confidence": 0.9}]}
+            for i in range(5)
+        ])
+        
+        timing_metrics, movement_metrics, feedback = analyzer_module.MotionAnalyzer().analyze(motion)
+        
+        assert movement_metrics.accuracy_score == 1.0
+        assert movement_metrics.energy_score == 1.0
+    
+    @pytest.mark.parametrize("field", ["x", "y", "z"])
+    def test_infinite_coordinate_rejected(self, analyzer_module, field):
+        """Test that an infinite coordinate is rejected, not scored as NaN."""
+        keypoint = {"x": 0.5, "y": 0.5, "confidence": 0.9}
+        keypoint[field] = float("inf")
+        motion = MotionData(frames=[
+            {"timestamp": 0.0, "keypoints": [{"x": 0.5, "y": 0.5, "confidence": 0.9}]},
+            {"timestamp": 0.033, "keypoints": [{"x": 0.5, "y": 0.5, "confidence": 0.9}, keypoint]}
+        ])
+        
+        with pytest.raises(MotionPayloadError) as excinfo:
+            analyzer_module.MotionAnalyzer().analyze(motion)
+        assert excinfo.value.loc == ("frames", 1, "keypoints", 1, field)
@@ -1,366 +1,335 @@
 """Test suite for the AI service."""
+import asyncio
+
+import orjson
 import pytest
-from fastapi.testclient import TestClient
-import sys
-import os
+from syrupy.filters import props
+
+from models import PredictionResult
+
+
+JSON_HDR = {"content-type": "application/json"}
+
+
+def round_floats(data, path):
+    """Snapshot matcher that compares floats to six decimal places."""
+    return round(data, 6) if isinstance(data, float) else data
+
+
+def check_high_energy(result):
+    # High energy motion should have higher energy score
+    assert result["movement_metrics"]["energy_score"] > 0.3
+
+
+def check_smooth(result):
+    # Smooth motion should have high smoothness score
+    assert result["movement_metrics"]["smoothness_score"] > 0.5
 
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from main import app
-from models import MotionData, Frame, KeyPoint
+def check_single_frame(result):
+    # Confidence 0.9 must come back exactly, not rounded through float32
+    assert result["movement_metrics"]["form_score"] == 0.9
+    assert result["overall_score"] == 83.5
 
 
-# Test client
-client = TestClient(app)
+def check_valid(result):
+    PredictionResult.model_validate(result)
+
+
+# (request body fixture, result check) for each valid /predict scenario
+PREDICT_CASES = [
+    pytest.param("bpm_motion_bytes", check_valid, id="with_bpm"),
+    pytest.param("high_energy_motion_bytes", check_high_energy, id="high_energy_motion"),
+    pytest.param("smooth_motion_bytes", check_smooth, id="smooth_motion"),
+    pytest.param("jerky_motion_bytes", check_valid, id="jerky_motion"),
+    pytest.param("single_frame_bytes", check_single_frame, id="single_frame"),
+    pytest.param("missing_confidence_bytes", check_valid, id="missing_confidence"),
+    pytest.param("keypoints_2d_bytes", check_valid, id="2d_keypoints"),
+    pytest.param("keypoints_3d_bytes", check_valid, id="3d_keypoints"),
+]
+
+
+# (path, expected fields) for each informational endpoint
+HEALTH_CASES = [
+    pytest.param("/", {"service": "StepFlow AI", "status": "running"}, id="root"),
+    pytest.param("/health", {"status": "healthy", "service": "stepflow-ai"}, id="health"),
+]
 
 
 class TestHealthEndpoints:
     """Test health check and root endpoints."""
     
-    def test_root(self):
-        """Test root endpoint."""
-        response = client.get("/")
+    @pytest.mark.parametrize("path,expected", HEALTH_CASES)
+    def test_health(self, client, path, expected):
+        """Test the endpoint over HTTP, through middleware and serialization."""
+        response = client.get(path)
         assert response.status_code == 200
+        
         data = response.json()
-        assert "service" in data
+        assert data.items() >= expected.items()
         assert "version" in data
-        assert data["service"] == "StepFlow AI"
     
-    def test_health_check(self):
-        """Test health check endpoint."""
-        response = client.get("/health")
-        assert response.status_code == 200
-        data = response.json()
-        assert data["status"] == "healthy"
+    @pytest.mark.parametrize("path,expected", HEALTH_CASES)
+    def test_health_direct(self, client, path, expected):
+        """Test the route handler's return value without a request round-trip."""
+        endpoint = next(
+            route.endpoint for route in client.app.routes
+            if getattr(route, "path", None) == path and "GET" in route.methods
+        )
+        
+        data = asyncio.run(endpoint())
+        assert data.items() >= expected.items()
         assert "version" in data
 
 
+class TestOpenAPISchema:
+    """Test the generated API documentation."""
+    
+    def test_openapi_documents_predict_errors(self, client):
+        """Test that /predict still documents its request body and 422 response."""
+        schema = client.get("/openapi.json").json()
+        
+        predict = schema["paths"]["/predict"]["post"]
+        assert predict["requestBody"]["content"]["application/json"]["schema"]["$ref"].endswith("/MotionData")
+        assert predict["responses"]["422"]["content"]["application/json"]["schema"]["$ref"].endswith(
+            "/HTTPValidationError"
+        )
+        assert {"MotionData", "HTTPValidationError", "ValidationError"} <= schema["components"]["schemas"].keys()
+
+
+@pytest.mark.xdist_group("predict")
 class TestPredictEndpoint:
     """Test /predict endpoint with various scenarios."""
     
-    def test_predict_basic_motion(self):
-        """Test basic motion data prediction."""
-        # Create simple motion data with 5 frames
-        motion_data = {
-            "frames": [
-                {
-                    "timestamp": 0.0,
-                    "keypoints": [
-                        {"x": 0.5, "y": 0.5, "z": 0.0, "confidence": 0.9},
-                        {"x": 0.6, "y": 0.4, "z": 0.0, "confidence": 0.85}
-                    ]
-                },
-                {
-                    "timestamp": 0.033,
-                    "keypoints": [
-                        {"x": 0.52, "y": 0.52, "z": 0.0, "confidence": 0.92},
-                        {"x": 0.62, "y": 0.42, "z": 0.0, "confidence": 0.88}
-                    ]
-                },
-                {
-                    "timestamp": 0.066,
-                    "keypoints": [
-                        {"x": 0.54, "y": 0.54, "z": 0.0, "confidence": 0.91},
-                        {"x": 0.64, "y": 0.44, "z": 0.0, "confidence": 0.87}
-                    ]
-                },
-                {
-                    "timestamp": 0.099,
-                    "keypoints": [
-                        {"x": 0.56, "y": 0.56, "z": 0.0, "confidence": 0.90},
-                        {"x": 0.66, "y": 0.46, "z": 0.0, "confidence": 0.86}
-                    ]
-                },
-                {
-                    "timestamp": 0.132,
-                    "keypoints": [
-                        {"x": 0.58, "y": 0.58, "z": 0.0, "confidence": 0.89},
-                        {"x": 0.68, "y": 0.48, "z": 0.0, "confidence": 0.85}
-                    ]
-                }
-            ]
-        }
+    @pytest.mark.parametrize("bytes_fixture,check", PREDICT_CASES)
+    def test_predict_variants(self, client, request, bytes_fixture, check):
+        """Test prediction on valid motion data of various shapes."""
+        motion_bytes = request.getfixturevalue(bytes_fixture)
         
-        response = client.post("/predict", json=motion_data)
+        response = client.post("/predict", content=motion_bytes, headers=JSON_HDR)
         assert response.status_code == 200
         
-        result = response.json()
-        assert "overall_score" in result
-        assert "timing_metrics" in result
-        assert "movement_metrics" in result
-        assert "feedback" in result
-        assert "processing_time_ms" in result
-        
-        # Validate score range
-        assert 0 <= result["overall_score"] <= 100
-        
-        # Validate timing metrics
-        timing = result["timing_metrics"]
-        assert 0 <= timing["sync_score"] <= 1
-        assert 0 <= timing["on_beat_percentage"] <= 100
-        
-        # Validate movement metrics
-        movement = result["movement_metrics"]
-        assert 0 <= movement["smoothness_score"] <= 1
-        assert 0 <= movement["accuracy_score"] <= 1
-        assert 0 <= movement["energy_score"] <= 1
-        assert 0 <= movement["form_score"] <= 1
-        
-        # Validate feedback
-        assert isinstance(result["feedback"], list)
-        assert len(result["feedback"]) > 0
-        
-        # Validate processing time
-        assert result["processing_time_ms"] > 0
+        check(response.json())
     
-    def test_predict_with_bpm(self):
-        """Test motion prediction with BPM for beat alignment."""
-        motion_data = {
-            "frames": [
-                {
-                    "timestamp": 0.0,
-                    "keypoints": [{"x": 0.5, "y": 0.5, "confidence": 0.9}]
-                },
-                {
-                    "timestamp": 0.5,
-                    "keypoints": [{"x": 0.6, "y": 0.6, "confidence": 0.9}]
-                },
-                {
-                    "timestamp": 1.0,
-                    "keypoints": [{"x": 0.5, "y": 0.5, "confidence": 0.9}]
-                },
-                {
-                    "timestamp": 1.5,
-                    "keypoints": [{"x": 0.6, "y": 0.6, "confidence": 0.9}]
-                }
-            ],
-            "audio_bpm": 120.0
-        }
-        
-        response = client.post("/predict", json=motion_data)
+    def test_predict_basic_motion(self, client, basic_motion_bytes, snapshot):
+        """Test the complete prediction for a basic motion against its snapshot."""
+        response = client.post("/predict", content=basic_motion_bytes, headers=JSON_HDR)
         assert response.status_code == 200
         
         result = response.json()
-        assert result["timing_metrics"]["avg_lag_ms"] >= 0
+        # Timing varies per run; round floats so fastmath reassociation on
+        # other CPUs doesn't break the comparison
+        assert result == snapshot(exclude=props("processing_time_ms"), matcher=round_floats)
+        assert result["processing_time_ms"] > 0
     
-    def test_predict_high_energy_motion(self):
-        """Test prediction with high-energy motion."""
-        motion_data = {
-            "frames": [
-                {
-                    "timestamp": i * 0.033,
-                    "keypoints": [
-                        {"x": 0.5 + i * 0.1, "y": 0.5 + i * 0.1, "confidence": 0.9},
-                        {"x": 0.3 - i * 0.05, "y": 0.7 + i * 0.05, "confidence": 0.85}
-                    ]
-                }
-                for i in range(10)
-            ]
-        }
-        
-        response = client.post("/predict", json=motion_data)
+    def test_predict_beat_alignment(self, client, offset_bpm_motion_bytes):
+        """Test that peaks are timed from frame timestamps, not an assumed 30fps from t=0."""
+        response = client.post("/predict", content=offset_bpm_motion_bytes, headers=JSON_HDR)
         assert response.status_code == 200
         
-        result = response.json()
-        # High energy motion should have higher energy score
-        assert result["movement_metrics"]["energy_score"] > 0.3
+        timing = response.json()["timing_metrics"]
+        # Peak lags are 0, 40, 0 and 240ms; only the last is off the beat
+        assert timing["on_beat_percentage"] == pytest.approx(75.0)
+        assert timing["avg_lag_ms"] == pytest.approx(70.0, abs=1e-6)
     
-    def test_predict_smooth_motion(self):
-        """Test prediction with smooth, consistent motion."""
+    def test_predict_empty_frames(self, client):
+        """Test prediction with empty frames list."""
+        motion_data = {"frames": []}
+        
+        response = client.post("/predict", content=orjson.dumps(motion_data), headers=JSON_HDR)
+        assert response.status_code == 422  # Validation error
+    
+    def test_predict_invalid_json(self, client):
+        """Test prediction with a malformed JSON body."""
+        response = client.post("/predict", content=b'{"frames": [', headers=JSON_HDR)
+        assert response.status_code == 422  # Validation error
+    
+    @pytest.mark.parametrize("content_type", ["text/plain", "application/x-www-form-urlencoded"])
+    def test_predict_non_json_content_type(self, client, basic_motion_bytes, content_type):
+        """Test that a valid body is rejected unless it is sent as JSON."""
+        response = client.post("/predict", content=basic_motion_bytes, headers={"content-type": content_type})
+        assert response.status_code == 422  # Validation error
+    
+    @pytest.mark.parametrize("confidence", [1.5, -0.1, "nan", "inf"])
+    def test_predict_invalid_confidence(self, client, confidence):
+        """Test prediction with out-of-range or non-finite keypoint confidence."""
         motion_data = {
             "frames": [
                 {
-                    "timestamp": i * 0.033,
-                    "keypoints": [
-                        {"x": 0.5 + i * 0.01, "y": 0.5 + i * 0.01, "confidence": 0.95},
-                        {"x": 0.6 + i * 0.01, "y": 0.4 + i * 0.01, "confidence": 0.95}
-                    ]
+                    "timestamp": 0.0,
+                    "keypoints": [{"x": 0.5, "y": 0.5, "confidence": confidence}]
                 }
-                for i in range(20)
             ]
         }
         
-        response = client.post("/predict", json=motion_data)
-        assert response.status_code == 200
-        
-        result = response.json()
-        # Smooth motion should have high smoothness score
-        assert result["movement_metrics"]["smoothness_score"] > 0.5
+        response = client.post("/predict", content=orjson.dumps(motion_data), headers=JSON_HDR)
+        assert response.status_code == 422  # Validation error
+        assert response.json()["detail"][0]["loc"] == ["body", "frames", 0, "keypoints", 0, "confidence"]
     
-    def test_predict_jerky_motion(self):
-        """Test prediction with jerky, inconsistent motion."""
+    def test_predict_missing_coordinate(self, client):
+        """Test prediction with a keypoint missing its y coordinate."""
         motion_data = {
             "frames": [
                 {
-                    "timestamp": i * 0.033,
-                    "keypoints": [
-                        {"x": 0.5 + ((-1) ** i) * 0.2, "y": 0.5 + ((-1) ** i) * 0.2, "confidence": 0.8}
-                    ]
+                    "timestamp": 0.0,
+                    "keypoints": [{"x": 0.5, "confidence": 0.9}]
                 }
-                for i in range(10)
             ]
         }
         
-        response = client.post("/predict", json=motion_data)
-        assert response.status_code == 200
-        
-        result = response.json()
-        # Jerky motion should have smoothness score in valid range
-        assert 0.0 <= result["movement_metrics"]["smoothness_score"] <= 1.0
+        response = client.post("/predict", content=orjson.dumps(motion_data), headers=JSON_HDR)
+        assert response.status_code == 422  # Validation error
+        assert response.json()["detail"][0]["loc"] == ["body", "frames", 0, "keypoints", 0, "y"]
     
-    def test_predict_empty_frames(self):
-        """Test prediction with empty frames list."""
-        motion_data = {"frames": []}
+    def test_predict_malformed_keypoints(self, client):
+        """Test that a malformed frame is reported at its field, not as a Python error."""
+        motion_data = {"frames": [{"timestamp": 0.0, "keypoints": "nose"}]}
         
-        response = client.post("/predict", json=motion_data)
+        response = client.post("/predict", content=orjson.dumps(motion_data), headers=JSON_HDR)
         assert response.status_code == 422  # Validation error
+        
+        error = response.json()["detail"][0]
+        assert error["loc"] == ["body", "frames", 0, "keypoints"]
+        assert error["msg"] == "keypoints must be a list of objects"
     
-    def test_predict_single_frame(self):
-        """Test prediction with single frame."""
+    @pytest.mark.parametrize("keypoint,frame_fields,loc", [
+        pytest.param(
+            {"x": [0.5], "y": [0.7], "z": [0.0], "confidence": [0.9]}, {},
+            ["keypoints", 0, "x"], id="singleton_lists"
+        ),
+        pytest.param(
+            {"x": [0.5, 0.6], "y": [0.7, 0.8], "z": [0.0, 0.0], "confidence": [0.9, 0.9]}, {},
+            ["keypoints", 0, "x"], id="pair_lists"
+        ),
+        pytest.param({"x": 0.5, "y": 0.5}, {"timestamp": [0.0]}, ["timestamp"], id="list_timestamp"),
+        pytest.param({"x": 0.5, "y": 0.5}, {"timestamp": [0.0, 0.1]}, ["timestamp"], id="pair_timestamp"),
+    ])
+    def test_predict_list_valued_fields(self, client, keypoint, frame_fields, loc):
+        """Test that list-valued numbers are rejected rather than flattened into the arrays."""
         motion_data = {
             "frames": [
-                {
-                    "timestamp": 0.0,
-                    "keypoints": [{"x": 0.5, "y": 0.5, "confidence": 0.9}]
-                }
+                {"timestamp": i * 0.033, "keypoints": [keypoint, keypoint], **frame_fields}
+                for i in range(3)
             ]
         }
         
-        response = client.post("/predict", json=motion_data)
-        assert response.status_code == 200
-        
-        result = response.json()
-        assert result["overall_score"] >= 0
+        response = client.post("/predict", content=orjson.dumps(motion_data), headers=JSON_HDR)
+        assert response.status_code == 422  # Validation error
+        assert response.json()["detail"][0]["loc"] == ["body", "frames", 0] + loc
     
-    def test_predict_missing_confidence(self):
-        """Test prediction with keypoints missing confidence values."""
+    @pytest.mark.parametrize("timestamps", [[0.0, 0.033, 0.0], [0.0, 0.033, 0.033]], ids=["backwards", "repeated"])
+    def test_predict_unordered_timestamps(self, client, timestamps):
+        """Test that timestamps which don't increase are rejected at the first offending frame."""
         motion_data = {
             "frames": [
-                {
-                    "timestamp": 0.0,
-                    "keypoints": [{"x": 0.5, "y": 0.5}]
-                },
-                {
-                    "timestamp": 0.033,
-                    "keypoints": [{"x": 0.52, "y": 0.52}]
-                }
+                {"timestamp": t, "keypoints": [{"x": 0.5 + i * 0.01, "y": 0.5, "confidence": 0.9}]}
+                for i, t in enumerate(timestamps)
             ]
         }
         
-        response = client.post("/predict", json=motion_data)
-        assert response.status_code == 200
+        response = client.post("/predict", content=orjson.dumps(motion_data), headers=JSON_HDR)
+        assert response.status_code == 422  # Validation error
+        assert response.json()["detail"][0]["loc"] == ["body", "frames", 2, "timestamp"]
     
-    def test_predict_2d_keypoints(self):
-        """Test prediction with 2D keypoints (no z coordinate)."""
+    @pytest.mark.parametrize("field", ["x", "y", "z"])
+    def test_predict_infinite_coordinate(self, client, field):
+        """Test that an infinite coordinate is rejected rather than scored as NaN."""
+        keypoint = {"x": 0.5, "y": 0.5, "confidence": 0.9}
+        keypoint[field] = "inf"
         motion_data = {
             "frames": [
-                {
-                    "timestamp": i * 0.033,
-                    "keypoints": [
-                        {"x": 0.5 + i * 0.01, "y": 0.5 + i * 0.01, "confidence": 0.9}
-                    ]
-                }
-                for i in range(5)
+                {"timestamp": 0.0, "keypoints": [keypoint]},
+                {"timestamp": 0.033, "keypoints": [{"x": 0.5, "y": 0.5, "confidence": 0.9}]}
             ]
         }
         
-        response = client.post("/predict", json=motion_data)
-        assert response.status_code == 200
+        response = client.post("/predict", content=orjson.dumps(motion_data), headers=JSON_HDR)
+        assert response.status_code == 422  # Validation error
+        assert response.json()["detail"][0]["loc"] == ["body", "frames", 0, "keypoints", 0, field]
     
-    def test_predict_3d_keypoints(self):
-        """Test prediction with 3D keypoints."""
+    def test_predict_large_coordinates(self, client):
+        """Test that large but finite coordinates still score (pixel space, far off-screen)."""
         motion_data = {
             "frames": [
                 {
                     "timestamp": i * 0.033,
-                    "keypoints": [
-                        {"x": 0.5 + i * 0.01, "y": 0.5 + i * 0.01, "z": 1.0 + i * 0.01, "confidence": 0.9}
-                    ]
+                    "keypoints": [{"x": 1e39 * (-1) ** i, "y": 0.5}, {"x": 0.1, "y": -1e20 * i}]
                 }
                 for i in range(5)
             ]
         }
         
-        response = client.post("/predict", json=motion_data)
+        response = client.post("/predict", content=orjson.dumps(motion_data), headers=JSON_HDR)
         assert response.status_code == 200
+        
+        PredictionResult.model_validate(response.json())
     
-    def test_predict_multiple_keypoints_per_frame(self):
+    def test_predict_multiple_keypoints_per_frame(self, client, full_body_motion_bytes):
         """Test prediction with multiple keypoints per frame (full body)."""
-        # Simulate 17 keypoints (typical pose estimation output)
+        response = client.post("/predict", content=full_body_motion_bytes, headers=JSON_HDR)
+        assert response.status_code == 200
+        
+        PredictionResult.model_validate(response.json())
+    
+    def test_predict_varying_keypoint_count(self, client):
+        """Test prediction when frames detect different numbers of keypoints."""
         motion_data = {
             "frames": [
                 {
-                    "timestamp": 0.0,
-                    "keypoints": [
-                        {"x": 0.5 + j * 0.05, "y": 0.5 + j * 0.03, "confidence": 0.9}
-                        for j in range(17)
-                    ]
-                },
-                {
-                    "timestamp": 0.033,
+                    "timestamp": i * 0.033,
                     "keypoints": [
-                        {"x": 0.5 + j * 0.05 + 0.01, "y": 0.5 + j * 0.03 + 0.01, "confidence": 0.9}
-                        for j in range(17)
+                        {"x": 0.5 + j * 0.05 + i * 0.01, "y": 0.5 + j * 0.03, "confidence": 0.9}
+                        for j in range(17 - (i % 3))
                     ]
                 }
+                for i in range(10)
             ]
         }
         
-        response = client.post("/predict", json=motion_data)
+        response = client.post("/predict", content=orjson.dumps(motion_data), headers=JSON_HDR)
         assert response.status_code == 200
         
-        result = response.json()
-        assert result["overall_score"] >= 0
+        PredictionResult.model_validate(response.json())
     
-    def test_predict_latency(self):
-        """Test that prediction is fast (< 1 second for typical input)."""
+    def test_predict_ragged_keypoint_counts(self, client):
+        """Test that one huge frame among many tiny ones is rejected instead of padded."""
         motion_data = {
             "frames": [
                 {
                     "timestamp": i * 0.033,
-                    "keypoints": [
-                        {"x": 0.5 + i * 0.01, "y": 0.5 + i * 0.01, "confidence": 0.9}
-                        for _ in range(17)
-                    ]
+                    "keypoints": [{"x": 0.5, "y": 0.5, "confidence": 0.9}] * (5000 if i == 1 else 1)
                 }
-                for i in range(30)  # 1 second of motion at 30fps
+                for i in range(1000)
             ]
         }
         
-        response = client.post("/predict", json=motion_data)
+        response = client.post("/predict", content=orjson.dumps(motion_data), headers=JSON_HDR)
+        assert response.status_code == 422  # Validation error
+        assert response.json()["detail"][0]["loc"] == ["body", "frames", 1, "keypoints"]
+    
+    @pytest.mark.slow
+    def test_predict_latency(self, client, latency_motion_bytes):
+        """Test that prediction is fast (< 1 second for typical input)."""
+        response = client.post("/predict", content=latency_motion_bytes, headers=JSON_HDR)
         assert response.status_code == 200
         
         result = response.json()
         # Processing should be fast for live interactions
         assert result["processing_time_ms"] < 1000  # Less than 1 second
     
-    def test_predict_long_sequence(self):
+    @pytest.mark.slow
+    def test_predict_long_sequence(self, client, long_motion_bytes):
         """Test prediction with longer motion sequence."""
-        motion_data = {
-            "frames": [
-                {
-                    "timestamp": i * 0.033,
-                    "keypoints": [
-                        {"x": 0.5 + (i % 20) * 0.01, "y": 0.5 + (i % 20) * 0.01, "confidence": 0.9}
-                    ]
-                }
-                for i in range(100)  # ~3 seconds
-            ],
-            "audio_bpm": 128.0
-        }
-        
-        response = client.post("/predict", json=motion_data)
+        response = client.post("/predict", content=long_motion_bytes, headers=JSON_HDR)
         assert response.status_code == 200
         
-        result = response.json()
-        assert 0 <= result["overall_score"] <= 100
+        PredictionResult.model_validate(response.json())
 
 
 class TestFeedbackGeneration:
     """Test feedback generation logic."""
     
-    def test_feedback_contains_required_fields(self):
+    def test_feedback_contains_required_fields(self, client):
         """Test that feedback items have required fields."""
         motion_data = {
             "frames": [
@@ -371,7 +340,7 @@ class TestFeedbackGeneration:
             ]
         }
         
-        response = client.post("/predict", json=motion_data)
+        response = client.post("/predict", content=orjson.dumps(motion_data), headers=JSON_HDR)
         assert response.status_code == 200
         
         result = response.json()